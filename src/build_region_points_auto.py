@@ -1,25 +1,53 @@
 # weather-alert-pipeline/src/build_region_points_auto.py
 from __future__ import annotations
 
-import json
+import heapq
 import os
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, Optional
 
 import geonamescache
 
+try:
+    from .json_io import write_json
+except ImportError:  # run as a script: python src/build_region_points_auto.py
+    from json_io import write_json
 
-def build_region_points_for_country(country_code: str, top_n: int = 3) -> List[Dict[str, Any]]:
+
+@lru_cache(maxsize=1)
+def _geonames() -> geonamescache.GeonamesCache:
+    """Shared GeonamesCache so the bundled cities JSON is only parsed once."""
+    return geonamescache.GeonamesCache()
+
+
+def index_cities_by_country(cities: Iterable[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Bucket geonames city records by country code in a single scan."""
+    by_country: Dict[str, List[Dict[str, Any]]] = {}
+    for city in cities:
+        by_country.setdefault(city.get("countrycode"), []).append(city)
+    return by_country
+
+
+def build_region_points_for_country(
+    country_code: str,
+    top_n: int = 3,
+    cities: Optional[Iterable[Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
     """
     Group cities by admin1 (region) and keep the top_n cities by population
     for each region in the given country.
+
+    ``cities`` can be this country's bucket from index_cities_by_country so
+    several countries share one scan of the world city list; by default the
+    full geonames list is scanned.
     """
-    gc = geonamescache.GeonamesCache()
-    cities = gc.get_cities()
+    if cities is None:
+        cities = _geonames().get_cities().values()
 
     by_region: Dict[str, List[Dict[str, Any]]] = {}
 
-    for city in cities.values():
+    for city in cities:
         if city.get("countrycode") != country_code:
             continue
 
@@ -46,8 +74,9 @@ def build_region_points_for_country(country_code: str, top_n: int = 3) -> List[D
 
     points: List[Dict[str, Any]] = []
     for admin1, rows in by_region.items():
-        rows_sorted = sorted(rows, key=lambda r: r["population"], reverse=True)
-        points.extend(rows_sorted[:top_n])
+        # nlargest matches sorted(..., reverse=True)[:top_n], ties included,
+        # without sorting the whole region.
+        points.extend(heapq.nlargest(top_n, rows, key=lambda r: r["population"]))
 
     return points
 
@@ -63,12 +92,15 @@ def main() -> None:
         top_n = 3
     top_n = max(1, min(top_n, 5))
 
+    # Scan the world city list once and hand each country its own bucket.
+    cities_by_country = index_cities_by_country(_geonames().get_cities().values())
+
     points: List[Dict[str, Any]] = []
     for cc in ["FR", "ES", "DE", "IT", "PT"]:
-        points.extend(build_region_points_for_country(cc, top_n=top_n))
+        points.extend(build_region_points_for_country(cc, top_n=top_n, cities=cities_by_country.get(cc, [])))
 
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(json.dumps(points, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(out_path, points)
 
     print(f"Wrote {len(points)} region (admin1) points to {out_path}")
 
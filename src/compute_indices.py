@@ -1,8 +1,45 @@
+from bisect import bisect_left, bisect_right
+import math
 from pathlib import Path
-import json
-from typing import Dict, Any, List
+import sys
+from typing import Dict, Any, List, Optional, Tuple
 from collections import defaultdict
 
+try:
+    from .json_io import read_json, write_json
+except ImportError:  # run as a script: python src/compute_indices.py
+    from json_io import read_json, write_json
+
+
+# Level thresholds, ordered ascending. A day reaches level n once it
+# crosses the n-th threshold, so the level is just the insertion point of the
+# value in the tuple (the same idea as numpy.searchsorted, but with bisect).
+HEAT_THRESHOLDS = (30.0, 35.0, 40.0)    # tmax_c >= threshold
+COLD_THRESHOLDS = (-10.0, -5.0, 0.0)    # tmin_c <= threshold
+WIND_THRESHOLDS = (50.0, 70.0, 90.0)    # wind_max_kmh >= threshold
+RAIN_THRESHOLDS = (20.0, 40.0, 60.0)    # rain_mm >= threshold
+
+# Simple snow hazard levels based on daily snowfall (water equivalent).
+# These thresholds are intentionally conservative and mostly intended for
+# relative regional comparisons.
+SNOW_THRESHOLDS = (10.0, 20.0, 40.0)    # snow_mm >= threshold
+
+
+def _level_at_least(thresholds: Tuple[float, ...], value: float) -> int:
+    """Number of thresholds ``value`` reaches (value >= threshold)."""
+    # NaN fails every comparison, so bisect would rank it above all
+    # thresholds; like the comparisons themselves, it reaches none of them.
+    if math.isnan(value):
+        return 0
+    return bisect_right(thresholds, value)
+
+
+def _level_at_most(thresholds: Tuple[float, ...], value: float) -> int:
+    """Number of thresholds ``value`` is at or below (lower is worse)."""
+    if math.isnan(value):
+        return 0
+    return len(thresholds) - bisect_left(thresholds, value)
+
 
 def classify_levels(row: Dict[str, Any]) -> Dict[str, int]:
 
@@ -12,83 +49,85 @@ def classify_levels(row: Dict[str, Any]) -> Dict[str, int]:
     rain = float(row["rain_mm"])
     snow = float(row.get("snow_mm", 0.0))
 
-    if tmax >= 40:
-        heat_level = 3
-    elif tmax >= 35:
-        heat_level = 2
-    elif tmax >= 30:
-        heat_level = 1
-    else:
-        heat_level = 0
-
-    if tmin <= -10:
-        cold_level = 3
-    elif tmin <= -5:
-        cold_level = 2
-    elif tmin <= 0:
-        cold_level = 1
-    else:
-        cold_level = 0
-
-    if wind >= 90:
-        wind_level = 3
-    elif wind >= 70:
-        wind_level = 2
-    elif wind >= 50:
-        wind_level = 1
-    else:
-        wind_level = 0
-
-    if rain >= 60:
-        rain_level = 3
-    elif rain >= 40:
-        rain_level = 2
-    elif rain >= 20:
-        rain_level = 1
-    else:
-        rain_level = 0
-
-    # Simple snow hazard levels based on daily snowfall (water equivalent).
-    # These thresholds are intentionally conservative and mostly intended for
-    # relative regional comparisons.
-    if snow >= 40:
-        snow_level = 3
-    elif snow >= 20:
-        snow_level = 2
-    elif snow >= 10:
-        snow_level = 1
-    else:
-        snow_level = 0
-
     return {
-        "heat_level": heat_level,
-        "cold_level": cold_level,
-        "wind_level": wind_level,
-        "rain_level": rain_level,
-        "snow_level": snow_level,
+        "heat_level": _level_at_least(HEAT_THRESHOLDS, tmax),
+        "cold_level": _level_at_most(COLD_THRESHOLDS, tmin),
+        "wind_level": _level_at_least(WIND_THRESHOLDS, wind),
+        "rain_level": _level_at_least(RAIN_THRESHOLDS, rain),
+        "snow_level": _level_at_least(SNOW_THRESHOLDS, snow),
     }
 
 
-def _safe_floats(group: List[Dict[str, Any]], key: str) -> List[float]:
-    """Extract finite float values for a given key, skipping None/invalid."""
-    values: List[float] = []
-    for row in group:
-        value = row.get(key)
-        if value is None:
-            continue
-        try:
-            values.append(float(value))
-        except (TypeError, ValueError):
-            continue
-    return values
-
+def _to_float(value: Any) -> Optional[float]:
+    """
+    Convert a raw value to a finite float, returning None for missing,
+    invalid or non-finite (NaN/inf) ones.
+    """
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _aggregate(group: List[Dict[str, Any]]) -> Optional[Tuple[float, float, float, float, float]]:
+    """
+    Collapse the city rows of one (date, region) into regional values in a
+    single pass: max tmax, min tmin, max wind, summed rain and snow.
+
+    Invalid/missing values are skipped. Returns None when any of the four
+    core fields has no valid value at all.
+    """
+    tmax: Optional[float] = None
+    tmin: Optional[float] = None
+    wind: Optional[float] = None
+    rain_vals: List[float] = []
+    snow_vals: List[float] = []
 
-def main() -> None:
+    for row in group:
+        hi = _to_float(row.get("tmax_c"))
+        if hi is not None and (tmax is None or hi > tmax):
+            tmax = hi
+        lo = _to_float(row.get("tmin_c"))
+        if lo is not None and (tmin is None or lo < tmin):
+            tmin = lo
+        w = _to_float(row.get("wind_max_kmh"))
+        if w is not None and (wind is None or w > wind):
+            wind = w
+        p = _to_float(row.get("rain_mm"))
+        if p is not None:
+            rain_vals.append(p)
+        sn = _to_float(row.get("snow_mm"))
+        if sn is not None:
+            snow_vals.append(sn)
+
+    if tmax is None or tmin is None or wind is None or not rain_vals:
+        return None
+
+    # Totals go through sum() so they round exactly as before.
+    rain = sum(rain_vals)  # or max/mean if you prefer
+    snow = sum(snow_vals) if snow_vals else 0.0
+    return tmax, tmin, wind, rain, snow
+
+
+def main() -> List[Dict[str, Any]]:
+    """Write regions_daily.json and return its rows for the later stages."""
     base_dir = Path(__file__).resolve().parents[1]
     raw_path = base_dir / "data" / "daily_region_raw.json"
     out_path = base_dir / "data" / "regions_daily.json"
 
-    rows: List[Dict[str, Any]] = json.loads(raw_path.read_text(encoding="utf-8"))
+    rows: List[Dict[str, Any]] = read_json(raw_path)
+
+    # The JSON decoder hands out a fresh str for every repeated value; intern
+    # the grouping fields so duplicates share one object (less memory, and
+    # the (date, region_code) keys compare by identity).
+    for row in rows:
+        for field in ("date", "country", "region_code", "region_id"):
+            value = row.get(field)
+            if isinstance(value, str):
+                row[field] = sys.intern(value)
 
     # group by (date, region_code)
     groups: Dict[tuple, List[Dict[str, Any]]] = defaultdict(list)
@@ -98,21 +137,13 @@ def main() -> None:
 
     out_rows: List[Dict[str, Any]] = []
     for (date_str, region_code), grp in groups.items():
-        tmax_vals = _safe_floats(grp, "tmax_c")
-        tmin_vals = _safe_floats(grp, "tmin_c")
-        wind_vals = _safe_floats(grp, "wind_max_kmh")
-        rain_vals = _safe_floats(grp, "rain_mm")
-        snow_vals = _safe_floats(grp, "snow_mm")
+        aggregated = _aggregate(grp)
 
         # If we have no valid data at all for this (date, region), skip it.
-        if not (tmax_vals and tmin_vals and wind_vals and rain_vals):
+        if aggregated is None:
             continue
 
-        tmax = max(tmax_vals)
-        tmin = min(tmin_vals)
-        wind = max(wind_vals)
-        rain = sum(rain_vals)  # or max/mean if you prefer
-        snow = sum(snow_vals) if snow_vals else 0.0
+        tmax, tmin, wind, rain, snow = aggregated
 
         base = grp[0]
         region_row = {
@@ -130,8 +161,9 @@ def main() -> None:
         out_rows.append(region_row)
 
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(json.dumps(out_rows, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(out_path, out_rows, compact=True)
     print(f"Wrote {len(out_rows)} rows to {out_path}")
+    return out_rows
 
 
 if __name__ == "__main__":
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
 from pathlib import Path 
-from datetime import datetime, timedelta, date 
-from typing import Any, Dict, List 
-import json 
+import sys
+from datetime import datetime, date 
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .json_io import read_json, write_json
+except ImportError:  # run as a script: python src/detect_alerts.py
+    from json_io import read_json, write_json
 
 HAZARDS = {
     "heat": {"field": "heat_level", "min_level": 1, "min_duration": 2},
@@ -15,43 +21,41 @@ HAZARDS = {
 
 DATE_FMT = "%Y-%m-%d"
 
+# The same few hundred date strings recur for every region and hazard, so
+# memoise the (slow) strptime call.
+@lru_cache(maxsize=4096)
 def parse_date(s: str) -> date:
     return datetime.strptime(s, DATE_FMT).date()
 
 def format_date(d: date) -> str:
     return d.strftime(DATE_FMT)
 
+# Per hazard: (source column, summary field, whether the extreme is a minimum).
+SUMMARY_FIELDS = {
+    "heat": ("tmax_c", "max_tmax_c", False),
+    "cold": ("tmin_c", "min_tmin_c", True),
+    "wind": ("wind_max_kmh", "max_wind_max_kmh", False),
+    "rain": ("rain_mm", "max_rain_mm", False),
+    "snow": ("snow_mm", "max_snow_mm", False),
+}
+
 def summarise_run(rows: List[Dict[str, Any]], hazard: str) -> Dict[str, Any]:
     first = rows[0]
     last = rows[-1]
 
-    levels = [int(r[f"{hazard}_level"]) for r in rows]
-    max_level = max(levels)
-
-    if hazard == "heat":
-        max_value = max(float(r["tmax_c"]) for r in rows)
-        value_field = "max_tmax_c"
-    elif hazard == "cold":
-        min_value = min(float(r["tmin_c"]) for r in rows)
-        return {
-            "country": first["country"],
-            "region_code": first["region_code"],
-            "hazard": hazard,
-            "start_date": first["date"],
-            "end_date": last["date"],
-            "n_days": len(rows),
-            "max_level": max_level,
-            "min_tmin_c": min_value,
-        }
-    elif hazard == "wind":
-        max_value = max(float(r["wind_max_kmh"]) for r in rows)
-        value_field = "max_wind_max_kmh"
-    elif hazard == "rain":
-        max_value = max(float(r["rain_mm"]) for r in rows)
-        value_field = "max_rain_mm"
-    else:  # snow
-        max_value = max(float(r.get("snow_mm", 0.0)) for r in rows)
-        value_field = "max_snow_mm"
+    column, value_field, use_min = SUMMARY_FIELDS.get(hazard, SUMMARY_FIELDS["snow"])
+    level_field = f"{hazard}_level"
+
+    # One pass collects both the peak level and the extreme value.
+    max_level = int(first[level_field])
+    extreme = float(first.get(column, 0.0))
+    for r in rows:
+        level = int(r[level_field])
+        if level > max_level:
+            max_level = level
+        value = float(r.get(column, 0.0))
+        if (value < extreme) if use_min else (value > extreme):
+            extreme = value
 
     return {
         "country": first["country"],
@@ -61,56 +65,98 @@ def summarise_run(rows: List[Dict[str, Any]], hazard: str) -> Dict[str, Any]:
         "end_date": last["date"],
         "n_days": len(rows),
         "max_level": max_level,
-        value_field: max_value,
+        value_field: extreme,
     }
 
+def scan_runs(
+        days: List[int],
+        levels: List[int],
+        min_level: int,
+        min_duration: int,
+) -> List[Tuple[int, int]]:
+    """
+    Find runs of consecutive days whose level is at least min_level and that
+    last at least min_duration days.
+
+    ``days`` holds date ordinals sorted ascending and ``levels`` the matching
+    hazard levels. Returns (start_index, end_index) pairs, end inclusive, so
+    callers only build summaries for the runs that qualify.
+    """
+    runs: List[Tuple[int, int]] = []
+    run_start = -1
+    prev_day = 0
+
+    for idx, (day, level) in enumerate(zip(days, levels)):
+        if level >= min_level:
+            # Start a new run unless this day directly extends the current one.
+            if run_start < 0 or day != prev_day + 1:
+                if run_start >= 0 and idx - run_start >= min_duration:
+                    runs.append((run_start, idx - 1))
+                run_start = idx
+        else:
+            if run_start >= 0 and idx - run_start >= min_duration:
+                runs.append((run_start, idx - 1))
+            run_start = -1
+
+        prev_day = day
+
+    if run_start >= 0 and len(days) - run_start >= min_duration:
+        runs.append((run_start, len(days) - 1))
+
+    return runs
+
+def sort_by_day(rows: List[Dict[str, Any]]) -> Tuple[List[int], List[Dict[str, Any]]]:
+    """
+    Sort rows chronologically, returning (day_ordinals, sorted_rows).
+
+    Each date is parsed once and the sort runs on the resulting ordinal.
+    """
+    decorated = sorted(
+        ((parse_date(r["date"]).toordinal(), r) for r in rows),
+        key=lambda pair: pair[0],
+    )
+    return [day for day, _ in decorated], [row for _, row in decorated]
+
 def detect_events_for_country(
         rows: List[Dict[str, Any]],
         hazard: str,
         cfg: Dict[str, Any],
+        days: Optional[List[int]] = None,
 ) -> List[Dict[str, Any]]:
-    
+    """
+    Detect runs of elevated levels for one hazard in one region's rows.
+
+    Pass ``days`` (from sort_by_day) to signal that ``rows`` are already
+    sorted; the caller can then sort a region once for all hazards.
+    """
     field = cfg["field"]
     min_level = cfg["min_level"]
     min_duration = cfg["min_duration"]
 
-    rows_sorted = sorted(rows, key=lambda r: parse_date(r["date"]))
-    events: List[Dict[str, Any]] = []
-
-    current_run: List[Dict[str, Any]] = [] 
-    prev_date: date | None = None 
-
-    for row in rows_sorted:
-        d = parse_date(row["date"])
-        level = int(row[field])
-
-        if level >= min_level:
-            if current_run and prev_date is not None and d == prev_date + timedelta(days=1):
-                current_run.append(row)
-            else:
-                if len(current_run) >= min_duration:
-                    events.append(summarise_run(current_run, hazard))
-                current_run = [row]
-        else:
-            if len(current_run) >= min_duration:
-                events.append(summarise_run(current_run, hazard))
-            current_run = []
-        
-        prev_date = d 
-
+    if days is None:
+        days, rows = sort_by_day(rows)
+    levels = [int(r[field]) for r in rows]
 
-    if len(current_run) >= min_duration:
-        events.append(summarise_run(current_run, hazard))
-    
-    return events
+    return [
+        summarise_run(rows[start:end + 1], hazard)
+        for start, end in scan_runs(days, levels, min_level, min_duration)
+    ]
 
-def main() -> None:
-    
+def main() -> List[Dict[str, Any]]:
+    """Write alerts.json and return the alerts for the later stages."""
     base_dir = Path(__file__).resolve().parents[1]
     daily_path = base_dir / "data" / "regions_daily.json"
     alerts_path = base_dir / "data" / "alerts.json"
 
-    rows: List[Dict[str, Any]] = json.loads(daily_path.read_text(encoding="utf-8"))
+    rows: List[Dict[str, Any]] = read_json(daily_path)
+
+    # Intern the repeated fields so parse_date's cache and the by_region
+    # dict hit on identical objects, and alerts share the same strings.
+    for row in rows:
+        for field in ("date", "country", "region_code"):
+            value = row.get(field)
+            if isinstance(value, str):
+                row[field] = sys.intern(value)
 
     by_region: Dict[str, List[Dict[str, Any]]] = {}
     for row in rows:
@@ -118,13 +164,16 @@ def main() -> None:
 
     all_alerts: List[Dict[str, Any]] = []
     for region_code, region_rows in by_region.items():
+        # Sort once per region; every hazard scans the same ordering.
+        days, region_rows = sort_by_day(region_rows)
         for hazard, cfg in HAZARDS.items():
-            events = detect_events_for_country(region_rows, hazard, cfg)
+            events = detect_events_for_country(region_rows, hazard, cfg, days=days)
             all_alerts.extend(events)
 
     alerts_path.parent.mkdir(parents=True, exist_ok=True)
-    alerts_path.write_text(json.dumps(all_alerts, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(alerts_path, all_alerts)
     print(f"Wrote {len(all_alerts)} alerts to {alerts_path}")
+    return all_alerts
 
 
 if __name__ == "__main__":
@@ -1,5 +1,24 @@
 from pathlib import Path
-import json
+import gzip
+import os
+import shutil
+
+# Optionally write pre-compressed ``.gz`` copies next to each exported file
+# (WEATHER_EXPORT_GZIP=1) so a static host that serves them does not have
+# to gzip multi-MB JSON on every request.
+EXPORT_GZIP = os.getenv("WEATHER_EXPORT_GZIP", "0") == "1"
+
+
+def write_gzip_copy(src: Path, dst: Path) -> bool:
+    """
+    Write a max-compression copy of ``src`` to ``<dst>.gz``, unless that file
+    is already newer than ``src``. Returns True if the file was (re)written.
+    """
+    gz_path = dst.with_name(dst.name + ".gz")
+    if gz_path.exists() and gz_path.stat().st_mtime >= src.stat().st_mtime:
+        return False
+    gz_path.write_bytes(gzip.compress(src.read_bytes(), compresslevel=9, mtime=0))
+    return True
 
 def main() -> None:
     base = Path(__file__).resolve().parents[1]
@@ -21,10 +40,13 @@ def main() -> None:
         ("pipeline_status.json", status_src),
     ]
 
+    # The source files are already the JSON the website expects, so copy the
+    # bytes as-is rather than parsing and re-serialising them.
     for name, src in files:
-        data = json.loads(src.read_text(encoding="utf-8"))
-        (out_dir / name).write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        shutil.copyfile(src, out_dir / name)
         print(f"Wrote {name} to {out_dir}")
+        if EXPORT_GZIP and write_gzip_copy(src, out_dir / name):
+            print(f"Wrote {name}.gz to {out_dir}")
 
 if __name__ == "__main__":
     main()
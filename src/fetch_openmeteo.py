@@ -1,25 +1,174 @@
-import json
+import hashlib
 import os
+import random
+import threading
 import time
-from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException, ReadTimeout
 
+try:
+    from .json_io import JSONDecodeError, loads_json, read_json, write_json
+except ImportError:  # run as a script: python src/fetch_openmeteo.py
+    from json_io import JSONDecodeError, loads_json, read_json, write_json
+
 BASE_DIR = Path(__file__).resolve().parents[1]
-REGION_POINTS: List[Dict[str, Any]] = json.loads(
-    (BASE_DIR / "data" / "region_points_admin1.json").read_text(encoding="utf-8")
-)
+
+
+@lru_cache(maxsize=1)
+def _region_points() -> List[Dict[str, Any]]:
+    """
+    Load region_points_admin1.json on first use rather than at import.
+
+    run_pipeline imports this module before build_region_points_auto rewrites
+    the file, so an import-time load would fetch the previous run's points.
+    """
+    return read_json(BASE_DIR / "data" / "region_points_admin1.json")
+
 
 # Number of days of history to keep per location using the Open‑Meteo archive API.
 HISTORY_DAYS = 180
 
+
+def _env_int(name: str, default: int, minimum: int = 1) -> int:
+    """Integer setting from the environment; ``default`` if unset or invalid."""
+    try:
+        value = int(os.getenv(name, str(default)))
+    except ValueError:
+        value = default
+    return max(minimum, value)
+
+
+def _env_float(name: str, default: float, minimum: float = 0.0) -> float:
+    """Float setting from the environment; ``default`` if unset or invalid."""
+    try:
+        value = float(os.getenv(name, str(default)))
+    except ValueError:
+        value = default
+    return max(minimum, value)
+
+
 # Allow CI or local runs to tweak network behaviour via env vars.
-REQUEST_TIMEOUT_SECONDS = int(os.getenv("WEATHER_REQUEST_TIMEOUT_SECONDS", "90"))
-ARCHIVE_SLEEP_SECONDS = float(os.getenv("WEATHER_ARCHIVE_SLEEP_SECONDS", "0.75"))
-FORECAST_SLEEP_SECONDS = float(os.getenv("WEATHER_FORECAST_SLEEP_SECONDS", "0.75"))
+REQUEST_TIMEOUT_SECONDS = _env_int("WEATHER_REQUEST_TIMEOUT_SECONDS", 90)
+ARCHIVE_SLEEP_SECONDS = _env_float("WEATHER_ARCHIVE_SLEEP_SECONDS", 0.75)
+FORECAST_SLEEP_SECONDS = _env_float("WEATHER_FORECAST_SLEEP_SECONDS", 0.75)
+
+# Number of requests kept in flight concurrently. The work is almost
+# entirely waiting on the network, so a few threads overlap the round trips;
+# the rate limiters below still cap the overall request rate.
+FETCH_CONCURRENCY = _env_int("WEATHER_FETCH_CONCURRENCY", 8)
+
+# Maximum number of points sent in one multi-location archive request. This
+# keeps URLs and response bodies at a reasonable size.
+ARCHIVE_BATCH_SIZE = _env_int("WEATHER_ARCHIVE_BATCH_SIZE", 50)
+
+# Same for multi-location Open‑Meteo forecast requests (daily mode without an
+# OpenWeatherMap key).
+FORECAST_BATCH_SIZE = _env_int("WEATHER_FORECAST_BATCH_SIZE", 50)
+
+# Archive responses for past dates do not change, so successful ones are kept
+# on disk and reused when the same request is repeated. Backfill ranges end
+# yesterday, so in practice that means re-runs on the same day (e.g. after a
+# failed run). Entries older than WEATHER_ARCHIVE_CACHE_DAYS are deleted;
+# 0 disables the cache.
+ARCHIVE_CACHE_DIR = BASE_DIR / ".cache" / "openmeteo"
+ARCHIVE_CACHE_DAYS = _env_float("WEATHER_ARCHIVE_CACHE_DAYS", 1.0)
+
+
+class _RateLimiter:
+    """
+    Thread-safe request spacing: successive wait() calls return at least
+    ``interval`` seconds apart, no matter how many workers share it. Each
+    caller reserves the next slot under the lock and sleeps outside it.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                slot = max(now, self._next_slot)
+                self._next_slot = slot + self.interval
+            if slot > now:
+                time.sleep(slot - now)
+            # A pause() may have landed while this caller slept on a slot it
+            # reserved earlier; if so, queue again behind the pause.
+            with self._lock:
+                if time.monotonic() >= self._paused_until:
+                    return
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hold back every worker's next request for at least ``seconds``,
+        including workers already sleeping on a reserved slot.
+        """
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._paused_until = max(self._paused_until, until)
+            self._next_slot = max(self._next_slot, until)
+
+
+# Upper bound on how long a single Retry-After header may stall the run.
+MAX_RETRY_AFTER_SECONDS = 60.0
+
+# Attempts per request (first try included) on 429, 5xx or a read timeout.
+FETCH_ATTEMPTS = _env_int("WEATHER_FETCH_ATTEMPTS", 5)
+
+
+def _backoff_seconds(attempt: int) -> float:
+    """
+    Exponential backoff with jitter for retry number ``attempt`` (0-based):
+    roughly 1, 2, 4, 8, 16s, capped at 32s. The jitter keeps workers that
+    failed together from retrying in lockstep.
+    """
+    return min(32.0, 2.0 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def _retry_after_seconds(resp: Optional[requests.Response], default: float) -> float:
+    """
+    Delay requested by a 429 response's Retry-After header (either seconds
+    or an HTTP date), capped at MAX_RETRY_AFTER_SECONDS. Falls back to
+    ``default`` when the header is missing or unparseable.
+    """
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if not value:
+        return default
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return default
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        delay = (when - datetime.now(timezone.utc)).total_seconds()
+    return min(max(delay, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+
+# Global throttles (one per API) to avoid hitting per-second limits.
+ARCHIVE_LIMITER = _RateLimiter(ARCHIVE_SLEEP_SECONDS)
+FORECAST_LIMITER = _RateLimiter(FORECAST_SLEEP_SECONDS)
+
+# One shared session so archive and forecast requests reuse keep-alive
+# TCP/TLS connections (one pool per API host) instead of handshaking for
+# every call. The pool is sized so each fetch worker can hold its own
+# connection. Retries stay in the fetch helpers rather than in the adapter,
+# so attempts are not multiplied.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=FETCH_CONCURRENCY))
 
 # Optional alternative forecast provider: OpenWeatherMap.
 # When OPENWEATHER_API_KEY is set, daily-mode forecast requests will use
@@ -31,20 +180,198 @@ OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 WEATHER_DEBUG = os.getenv("WEATHER_DEBUG", "0") == "1"
 
 
-def fetch_daily_for_point(pt: Dict[str, Any], start_date: str, end_date: str) -> List[Dict[str, Any]]:
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+@lru_cache(maxsize=64)
+def _utc_day_iso(day_number: int) -> str:
+    """ISO date for a day count since the Unix epoch (UTC), memoised per day."""
+    return date.fromordinal(_EPOCH_ORDINAL + day_number).isoformat()
+
+
+def _point_fields(pt: Dict[str, Any]) -> Dict[str, Any]:
+    """Point-level fields shared by every row for ``pt``; merged into each row."""
+    return {
+        "country": pt["country"],
+        "region_id": pt["region_id"],
+        "region_code": pt["region_code"],
+        "city": pt["city"],
+    }
+
+
+def _rows_from_daily(pt: Dict[str, Any], daily: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Turn an Open‑Meteo ``daily`` block into one row per day for ``pt``."""
+    dates = daily["time"]
+    tmax  = daily["temperature_2m_max"]
+    tmin  = daily["temperature_2m_min"]
+    wind  = daily["wind_speed_10m_max"]
+    rain  = daily["precipitation_sum"]
+    snow  = daily.get("snowfall_sum")
+
+    # Align the optional snow series with the dates up front; if Open‑Meteo
+    # does not return (enough) snowfall for a location these stay as None.
+    if snow is None:
+        snow = [None] * len(dates)
+    elif len(snow) < len(dates):
+        snow = list(snow) + [None] * (len(dates) - len(snow))
+
+    # Only rows with an ISO date string are emitted, so the mode runners
+    # never have to re-check it.
+    base = _point_fields(pt)
+    return [
+        {
+            "date": d,
+            **base,
+            "tmax_c": hi,
+            "tmin_c": lo,
+            "wind_max_kmh": w,
+            "rain_mm": p,
+            "snow_mm": snow_mm,
+        }
+        for d, hi, lo, w, p, snow_mm in zip(dates, tmax, tmin, wind, rain, snow)
+        if isinstance(d, str) and d
+    ]
+
+
+class _RequestAbandoned(Exception):
+    """
+    A request was given up for a reason that splitting a batch would not fix:
+    429/5xx/read-timeout retries ran out, or the transport failed. Batch
+    callers skip the batch instead of re-sending every point on its own.
     """
-    Fetch daily *historical* data for a single point between start_date and
-    end_date (inclusive) using the Open‑Meteo archive API.
 
-    This is used for one‑off / manual backfills to build an initial history
-    window (e.g. 180 days). It is intentionally separated from the lighter
-    "daily" mode used by CI so we don't accidentally keep re‑backfilling
-    history on GitHub Actions.
+
+def _get_with_retries(
+    base_url: str,
+    params: Dict[str, Any],
+    limiter: _RateLimiter,
+    label: str,
+) -> Optional[requests.Response]:
+    """
+    GET ``base_url`` through the shared session, spaced by ``limiter``.
+
+    429, 5xx and read timeouts are retried up to FETCH_ATTEMPTS times in all,
+    with exponential backoff and jitter. A 429 honours Retry-After and holds
+    back every worker sharing the limiter. Status codes are checked directly
+    rather than through raise_for_status(), so no exception is built per
+    response.
+
+    Returns the successful response, or None for any other 4xx (the request
+    itself was rejected, so a smaller one may still work). Raises
+    _RequestAbandoned once 429/5xx/timeout retries run out or on other
+    transport errors, which are not retried.
+    """
+    for attempt in range(FETCH_ATTEMPTS):
+        retries_left = attempt < FETCH_ATTEMPTS - 1
+        try:
+            limiter.wait()
+            resp = SESSION.get(base_url, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
+        except ReadTimeout as error:
+            if not retries_left:
+                print(f"[fetch_openmeteo] Skipping {label} due to read timeout: {error}")
+                raise _RequestAbandoned(label) from error
+            delay = _backoff_seconds(attempt)
+            print(
+                f"[fetch_openmeteo] Read timeout for {label}, sleeping {delay:.1f}s "
+                f"and retrying ({attempt + 1}/{FETCH_ATTEMPTS - 1})...",
+            )
+            time.sleep(delay)
+            continue
+        except RequestException as error:
+            print(f"[fetch_openmeteo] Skipping {label} due to error: {error}")
+            raise _RequestAbandoned(label) from error
+
+        status = resp.status_code
+        if status < 400:
+            return resp
+
+        if (status == 429 or status >= 500) and retries_left:
+            if status == 429:
+                # Too many requests – back off (as long as the server asks,
+                # for every worker).
+                delay = _retry_after_seconds(resp, _backoff_seconds(attempt))
+                limiter.pause(delay)
+            else:
+                delay = _backoff_seconds(attempt)
+                time.sleep(delay)
+            print(
+                f"[fetch_openmeteo] HTTP {status} for {label}, sleeping {delay:.1f}s "
+                f"and retrying ({attempt + 1}/{FETCH_ATTEMPTS - 1})...",
+            )
+            continue
+
+        if WEATHER_DEBUG:
+            print(f"[fetch_openmeteo] HTTP {status} body for {label}: {resp.text[:200]!r}")
+        print(f"[fetch_openmeteo] Skipping {label} due to HTTP {status}")
+        if status == 429 or status >= 500:
+            raise _RequestAbandoned(label)
+        return None
+
+    raise _RequestAbandoned(label)
+
+
+def _archive_cache_path(base_url: str, params: Dict[str, Any]) -> Path:
+    key = base_url + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+    return ARCHIVE_CACHE_DIR / (hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+
+def _archive_cache_expired(path: Path) -> bool:
+    return time.time() - path.stat().st_mtime > ARCHIVE_CACHE_DAYS * 86400
+
+
+def _read_archive_cache(path: Path) -> Optional[bytes]:
+    if ARCHIVE_CACHE_DAYS <= 0:
+        return None
+    try:
+        if _archive_cache_expired(path):
+            path.unlink(missing_ok=True)
+            return None
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
+def prune_archive_cache() -> None:
+    """
+    Delete expired archive cache entries. Keys include the date range, which
+    moves every day, so old entries are never read again and would otherwise
+    pile up under .cache/openmeteo.
+    """
+    if ARCHIVE_CACHE_DAYS <= 0 or not ARCHIVE_CACHE_DIR.is_dir():
+        return
+    for path in ARCHIVE_CACHE_DIR.iterdir():
+        try:
+            if _archive_cache_expired(path):
+                path.unlink(missing_ok=True)
+        except OSError:
+            continue
+
+
+def _write_archive_cache(path: Path, payload: bytes) -> None:
+    if ARCHIVE_CACHE_DAYS <= 0:
+        return
+    # Write to a per-thread temp file and rename, so concurrent workers never
+    # see a half-written entry.
+    tmp_path = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_bytes(payload)
+        os.replace(tmp_path, path)
+    except OSError as error:
+        print(f"[fetch_openmeteo] Could not write archive cache {path.name}: {error}")
+
+
+def _get_archive(latitude: Any, longitude: Any, start_date: str, end_date: str, label: str) -> Any:
+    """
+    Call the Open‑Meteo archive API and return the decoded JSON, or None if
+    the request is rejected with a 4xx. ``latitude``/``longitude`` may be
+    comma-separated lists, in which case the response is a list with one
+    entry per coordinate. Raises _RequestAbandoned when retries run out.
     """
     base_url = "https://archive-api.open-meteo.com/v1/archive"
     params = {
-        "latitude": pt["lat"],
-        "longitude": pt["lon"],
+        "latitude": latitude,
+        "longitude": longitude,
         "daily": (
             "temperature_2m_max,temperature_2m_min,"
             "wind_speed_10m_max,precipitation_sum,"
@@ -55,163 +382,159 @@ def fetch_daily_for_point(pt: Dict[str, Any], start_date: str, end_date: str) ->
         "end_date": end_date,
     }
 
-    # Basic rate limiting: small sleep between calls plus a simple retry on 429.
-    for attempt in range(2):
+    cache_path = _archive_cache_path(base_url, params)
+    cached = _read_archive_cache(cache_path)
+    if cached is not None:
         try:
-            # Global throttle to avoid hitting Open‑Meteo per‑second limits.
-            time.sleep(ARCHIVE_SLEEP_SECONDS)
-            resp = requests.get(base_url, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
-            resp.raise_for_status()
-            break
-        except ReadTimeout as error:
-            if attempt == 0:
-                print(
-                    f"[fetch_openmeteo] Read timeout for {pt.get('region_code')} / {pt.get('city')}, "
-                    "sleeping and retrying once...",
-                )
-                time.sleep(5.0)
-                continue
+            return loads_json(cached)
+        except JSONDecodeError:
+            pass
 
-            print(
-                f"[fetch_openmeteo] Skipping {pt.get('region_code')} / {pt.get('city')} "
-                f"due to read timeout: {error}"
-            )
-            return []
-        except RequestException as error:
-            status = getattr(getattr(error, "response", None), "status_code", None)
-            if status == 429 and attempt == 0:
-                # Too many requests – back off and retry once.
-                print(
-                    f"[fetch_openmeteo] 429 for {pt.get('region_code')} / {pt.get('city')}, "
-                    "sleeping and retrying once...",
-                )
-                time.sleep(3.0)
-                continue
+    resp = _get_with_retries(base_url, params, ARCHIVE_LIMITER, label)
+    if resp is None:
+        return None
 
-            print(f"[fetch_openmeteo] Skipping {pt.get('region_code')} / {pt.get('city')} due to error: {error}")
-            return []
-
-    data = resp.json() 
-
-    dates = data["daily"]["time"]
-    tmax  = data["daily"]["temperature_2m_max"]
-    tmin  = data["daily"]["temperature_2m_min"]
-    wind  = data["daily"]["wind_speed_10m_max"]
-    rain  = data["daily"]["precipitation_sum"]
-    snow  = data["daily"].get("snowfall_sum")
-
-    rows: list[dict] = []
-
-    # Align optional snow series by index; if Open‑Meteo does not return
-    # snowfall for a location these stay as None.
-    for idx, (d, hi, lo, w, p) in enumerate(zip(dates, tmax, tmin, wind, rain)):
-        snow_mm = snow[idx] if snow is not None and idx < len(snow) else None
-        rows.append(
-            {
-                "date": d,
-                "country": pt["country"],
-                "region_id": pt["region_id"],
-                "region_code": pt["region_code"],
-                "city": pt["city"],
-                "tmax_c": hi,
-                "tmin_c": lo,
-                "wind_max_kmh": w,
-                "rain_mm": p,
-                "snow_mm": snow_mm,
-            },
-        )
+    data = loads_json(resp.content)
+    # Only completed days are final; a range reaching today is still filling in.
+    if end_date < date.today().isoformat():
+        _write_archive_cache(cache_path, resp.content)
+    return data
 
-    return rows 
 
+def fetch_daily_for_point(pt: Dict[str, Any], start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    """
+    Fetch daily *historical* data for a single point between start_date and
+    end_date (inclusive) using the Open‑Meteo archive API.
 
-def fetch_forecast_for_point(pt: Dict[str, Any]) -> List[Dict[str, Any]]:
+    This is used for one‑off / manual backfills to build an initial history
+    window (e.g. 180 days). It is intentionally separated from the lighter
+    "daily" mode used by CI so we don't accidentally keep re‑backfilling
+    history on GitHub Actions.
     """
-    Fetch a short *forecast* for a single point.
+    label = f"{pt.get('region_code')} / {pt.get('city')}"
+    try:
+        data = _get_archive(pt["lat"], pt["lon"], start_date, end_date, label)
+    except _RequestAbandoned:
+        return []
+    if data is None:
+        return []
 
-    - If OPENWEATHER_API_KEY is set, use OpenWeatherMap's free 5‑day /
-      3‑hour forecast API and aggregate to daily values.
-    - Otherwise, fall back to the Open‑Meteo forecast endpoint.
+    return _rows_from_daily(pt, data["daily"])
 
-    In both cases we aim to keep just today + tomorrow so the daily CI
-    pipeline remains lightweight.
+
+def fetch_daily_for_points(points: List[Dict[str, Any]], start_date: str, end_date: str) -> List[Dict[str, Any]]:
     """
-    if OPENWEATHER_API_KEY:
-        base_url = "https://api.openweathermap.org/data/2.5/forecast"
-        params = {
-            "lat": pt["lat"],
-            "lon": pt["lon"],
-            "units": "metric",
-            "appid": OPENWEATHER_API_KEY,
-        }
-        provider = "openweather-forecast"
-    else:
-        base_url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude": pt["lat"],
-            "longitude": pt["lon"],
-            "daily": (
-                "temperature_2m_max,temperature_2m_min,"
-                "wind_speed_10m_max,precipitation_sum,"
-                "snowfall_sum"
-            ),
-            # We only care about today and tomorrow; Open‑Meteo will always
-            # include "today" as the first daily entry.
-            "forecast_days": 2,
-            "timezone": "Europe/Berlin",
-        }
-        provider = "open-meteo"
+    Same as fetch_daily_for_point, but for several points sharing one date
+    range. The archive API accepts comma-separated coordinates, so the whole
+    batch costs a single round trip. If the batched call is rejected (4xx)
+    or returns an unexpected shape we fall back to one request per point. If
+    it stays throttled or failing through every retry, the batch is skipped:
+    re-sending each point would only multiply the load on a struggling API.
+    """
+    if len(points) == 1:
+        return fetch_daily_for_point(points[0], start_date, end_date)
+
+    first = points[0]
+    label = f"batch of {len(points)} points from {first.get('region_code')} / {first.get('city')}"
+    try:
+        data = _get_archive(
+            ",".join(str(pt["lat"]) for pt in points),
+            ",".join(str(pt["lon"]) for pt in points),
+            start_date,
+            end_date,
+            label,
+        )
+    except _RequestAbandoned:
+        return []
+
+    # Open‑Meteo returns a list aligned with the input coordinates.
+    if not isinstance(data, list) or len(data) != len(points):
+        print(f"[fetch_openmeteo] Falling back to per-point archive requests for {label}")
+        rows: List[Dict[str, Any]] = []
+        for pt in points:
+            rows.extend(fetch_daily_for_point(pt, start_date, end_date))
+        return rows
+
+    rows = []
+    for pt, block in zip(points, data):
+        rows.extend(_rows_from_daily(pt, block["daily"]))
+    return rows
+
+
+OPEN_METEO_FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+
 
+def _forecast_params_open_meteo(latitude: Any, longitude: Any) -> Dict[str, Any]:
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "daily": (
+            "temperature_2m_max,temperature_2m_min,"
+            "wind_speed_10m_max,precipitation_sum,"
+            "snowfall_sum"
+        ),
+        # We only care about today and tomorrow; Open‑Meteo will always
+        # include "today" as the first daily entry.
+        "forecast_days": 2,
+        "timezone": "Europe/Berlin",
+    }
+
+
+def _get_forecast(base_url: str, params: Dict[str, Any], provider: str, label: str) -> Any:
+    """
+    Call a forecast API and return the decoded JSON, or None if the request
+    is rejected with a 4xx. Raises _RequestAbandoned when retries run out.
+    """
     if WEATHER_DEBUG:
         print(
             "[fetch_openmeteo] forecast: "
             f"provider={provider}, "
-            f"region={pt.get('region_code')}, "
-            f"city={pt.get('city')}, "
+            f"target={label}, "
             f"timeout={REQUEST_TIMEOUT_SECONDS}s",
         )
 
-    for attempt in range(2):
-        try:
-            time.sleep(FORECAST_SLEEP_SECONDS)
-            resp = requests.get(base_url, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
-            resp.raise_for_status()
-            break
-        except ReadTimeout as error:
-            if attempt == 0:
-                print(
-                    f"[fetch_openmeteo] Read timeout (forecast, {provider}) for "
-                    f"{pt.get('region_code')} / {pt.get('city')}, sleeping and retrying once...",
-                )
-                time.sleep(5.0)
-                continue
+    resp = _get_with_retries(base_url, params, FORECAST_LIMITER, f"forecast ({provider}) for {label}")
+    if resp is None:
+        return None
+    return loads_json(resp.content)
 
-            print(
-                f"[fetch_openmeteo] Skipping forecast (forecast, {provider}) for "
-                f"{pt.get('region_code')} / {pt.get('city')} due to read timeout: {error}",
-            )
-            return []
-        except RequestException as error:
-            status = getattr(getattr(error, "response", None), "status_code", None)
-            if status == 429 and attempt == 0:
-                print(
-                    f"[fetch_openmeteo] 429 (forecast, {provider}) for "
-                    f"{pt.get('region_code')} / {pt.get('city')}, sleeping and retrying once...",
-                )
-                time.sleep(3.0)
-                continue
 
-            if WEATHER_DEBUG:
-                print(
-                    f"[fetch_openmeteo] RequestException (forecast, {provider}) for "
-                    f"{pt.get('region_code')} / {pt.get('city')}: status={status}, error={error}",
-                )
-            print(
-                f"[fetch_openmeteo] Skipping forecast (forecast, {provider}) for "
-                f"{pt.get('region_code')} / {pt.get('city')} due to error: {error}",
-            )
-            return []
+def fetch_forecast_for_point(pt: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Fetch a short *forecast* for a single point.
+
+    - If OPENWEATHER_API_KEY is set, use OpenWeatherMap's free 5‑day /
+      3‑hour forecast API and aggregate to daily values.
+    - Otherwise, fall back to the Open‑Meteo forecast endpoint.
 
-    data = resp.json()
+    In both cases we aim to keep just today + tomorrow so the daily CI
+    pipeline remains lightweight.
+    """
+    label = f"{pt.get('region_code')} / {pt.get('city')}"
+    try:
+        if OPENWEATHER_API_KEY:
+            data = _get_forecast(
+                "https://api.openweathermap.org/data/2.5/forecast",
+                {
+                    "lat": pt["lat"],
+                    "lon": pt["lon"],
+                    "units": "metric",
+                    "appid": OPENWEATHER_API_KEY,
+                },
+                "openweather-forecast",
+                label,
+            )
+        else:
+            data = _get_forecast(
+                OPEN_METEO_FORECAST_URL,
+                _forecast_params_open_meteo(pt["lat"], pt["lon"]),
+                "open-meteo",
+                label,
+            )
+    except _RequestAbandoned:
+        return []
+    if data is None:
+        return []
 
     rows: List[Dict[str, Any]] = []
 
@@ -224,128 +547,173 @@ def fetch_forecast_for_point(pt: Dict[str, Any]) -> List[Dict[str, Any]]:
         # - max wind speed
         # - sum of rain and snow
         forecast_list = data.get("list") or []
-        by_date: Dict[str, Dict[str, Any]] = {}
+        # Per date: [tmax_c, tmin_c, wind_max_kmh, rain_mm, snow_mm], kept
+        # as a mutable list so a new date costs one small allocation.
+        by_date: Dict[str, List[Any]] = {}
 
         for entry in forecast_list:
             dt = entry.get("dt")
             if not isinstance(dt, (int, float)):
                 continue
 
-            date_iso = datetime.utcfromtimestamp(dt).date().isoformat()
+            # A 5-day forecast spans only a handful of calendar days, so map
+            # the timestamp to a UTC day number and format each day once.
+            date_iso = _utc_day_iso(int(dt) // 86400)
             main = entry.get("main") or {}
             hi = main.get("temp_max")
             lo = main.get("temp_min")
             wind_info = entry.get("wind") or {}
             wind_speed = wind_info.get("speed")
 
-            # Rain/snow volumes are per 3h step; sum them for the day.
-            rain_block = entry.get("rain") or {}
-            snow_block = entry.get("snow") or {}
-            rain_step = rain_block.get("3h") or 0.0
-            snow_step = snow_block.get("3h") or 0.0
-
             # Require temperature and wind to be present.
             if hi is None or lo is None or wind_speed is None:
                 continue
 
-            agg = by_date.setdefault(
-                date_iso,
-                {
-                    "tmax_c": hi,
-                    "tmin_c": lo,
-                    "wind_max_kmh": float(wind_speed) * 3.6,
-                    "rain_mm": 0.0,
-                    "snow_mm": 0.0,
-                },
-            )
-
-            agg["tmax_c"] = max(agg["tmax_c"], hi)
-            agg["tmin_c"] = min(agg["tmin_c"], lo)
-            agg["wind_max_kmh"] = max(agg["wind_max_kmh"], float(wind_speed) * 3.6)
-            agg["rain_mm"] += float(rain_step)
-            agg["snow_mm"] += float(snow_step)
+            # Rain/snow volumes are per 3h step; sum them for the day.
+            rain_block = entry.get("rain")
+            snow_block = entry.get("snow")
+            rain_step = float(rain_block.get("3h") or 0.0) if rain_block else 0.0
+            snow_step = float(snow_block.get("3h") or 0.0) if snow_block else 0.0
+            wind_kmh = float(wind_speed) * 3.6
+
+            agg = by_date.get(date_iso)
+            if agg is None:
+                by_date[date_iso] = [hi, lo, wind_kmh, rain_step, snow_step]
+                continue
 
-        for date_iso, agg in by_date.items():
+            if hi > agg[0]:
+                agg[0] = hi
+            if lo < agg[1]:
+                agg[1] = lo
+            if wind_kmh > agg[2]:
+                agg[2] = wind_kmh
+            agg[3] += rain_step
+            agg[4] += snow_step
+
+        base = _point_fields(pt)
+        for date_iso, (tmax_c, tmin_c, wind_max_kmh, rain_mm, snow_mm) in by_date.items():
             rows.append(
                 {
                     "date": date_iso,
-                    "country": pt["country"],
-                    "region_id": pt["region_id"],
-                    "region_code": pt["region_code"],
-                    "city": pt["city"],
-                    "tmax_c": agg["tmax_c"],
-                    "tmin_c": agg["tmin_c"],
-                    "wind_max_kmh": agg["wind_max_kmh"],
-                    "rain_mm": agg["rain_mm"],
-                    "snow_mm": agg["snow_mm"],
-                },
-            )
-    else:
-        dates = data["daily"]["time"]
-        tmax = data["daily"]["temperature_2m_max"]
-        tmin = data["daily"]["temperature_2m_min"]
-        wind = data["daily"]["wind_speed_10m_max"]
-        rain = data["daily"]["precipitation_sum"]
-        snow = data["daily"].get("snowfall_sum")
-
-        for idx, (d, hi, lo, w, p) in enumerate(zip(dates, tmax, tmin, wind, rain)):
-            snow_mm = snow[idx] if snow is not None and idx < len(snow) else None
-            rows.append(
-                {
-                    "date": d,
-                    "country": pt["country"],
-                    "region_id": pt["region_id"],
-                    "region_code": pt["region_code"],
-                    "city": pt["city"],
-                    "tmax_c": hi,
-                    "tmin_c": lo,
-                    "wind_max_kmh": w,
-                    "rain_mm": p,
+                    **base,
+                    "tmax_c": tmax_c,
+                    "tmin_c": tmin_c,
+                    "wind_max_kmh": wind_max_kmh,
+                    "rain_mm": rain_mm,
                     "snow_mm": snow_mm,
                 },
             )
+    else:
+        rows = _rows_from_daily(pt, data["daily"])
 
     return rows
 
 
+def fetch_forecast_for_points(points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Same as fetch_forecast_for_point, but for several points. The Open‑Meteo
+    forecast API accepts comma-separated coordinates like the archive API, so
+    the batch costs one round trip; OpenWeatherMap does not, so with an API
+    key each point is still requested on its own. As with the archive batch,
+    a rejected (4xx) or misshapen response falls back to one request per
+    point, while a batch still throttled or failing after every retry is
+    skipped.
+    """
+    if OPENWEATHER_API_KEY or len(points) == 1:
+        rows: List[Dict[str, Any]] = []
+        for pt in points:
+            rows.extend(fetch_forecast_for_point(pt))
+        return rows
+
+    first = points[0]
+    label = f"batch of {len(points)} points from {first.get('region_code')} / {first.get('city')}"
+    try:
+        data = _get_forecast(
+            OPEN_METEO_FORECAST_URL,
+            _forecast_params_open_meteo(
+                ",".join(str(pt["lat"]) for pt in points),
+                ",".join(str(pt["lon"]) for pt in points),
+            ),
+            "open-meteo",
+            label,
+        )
+    except _RequestAbandoned:
+        return []
+
+    # Open‑Meteo returns a list aligned with the input coordinates.
+    if not isinstance(data, list) or len(data) != len(points):
+        print(f"[fetch_openmeteo] Falling back to per-point forecast requests for {label}")
+        rows = []
+        for pt in points:
+            rows.extend(fetch_forecast_for_point(pt))
+        return rows
+
+    rows = []
+    for pt, block in zip(points, data):
+        rows.extend(_rows_from_daily(pt, block["daily"]))
+    return rows
+
+
+def _load_existing_rows(out_path: Path) -> List[Dict[str, Any]]:
+    """
+    Load the previously written raw rows, keeping only well-formed ones.
+
+    Rows are validated once here (a dict with a string ``date``) so the
+    trimming filters in the mode runners can index ``row["date"]`` directly.
+    """
+    if not out_path.exists():
+        return []
+    try:
+        parsed = read_json(out_path)
+    except JSONDecodeError:
+        return []
+    if not isinstance(parsed, list):
+        return []
+    return [row for row in parsed if isinstance(row, dict) and isinstance(row.get("date"), str)]
+
+
 def run_backfill_mode(out_path: Path) -> None:
     """
     Original "full history" mode: build / refresh a HISTORY_DAYS‑long window
     using the archive API. This is suitable for manual runs on your machine
     but is too heavy for a daily GitHub Actions job.
     """
-    existing_rows: List[Dict[str, Any]] = []
-    if out_path.exists():
-        try:
-            parsed = json.loads(out_path.read_text(encoding="utf-8"))
-            if isinstance(parsed, list):
-                existing_rows = parsed
-        except json.JSONDecodeError:
-            existing_rows = []
+    existing_rows = _load_existing_rows(out_path)
+    prune_archive_cache()
 
     end = date.today() - timedelta(days=1)
     history_start = end - timedelta(days=HISTORY_DAYS - 1)
 
-    latest_by_region: Dict[str, date] = {}
+    # ISO-8601 dates order correctly as strings, so find each region's latest
+    # date by plain string comparison and only parse the winner. The length
+    # check stands in for parsing every row: it keeps malformed values from
+    # winning the comparison (and forcing a full re-fetch of that region).
+    history_start_iso = history_start.isoformat()
+    latest_iso_by_region: Dict[str, str] = {}
+    has_expired_rows = False
     for row in existing_rows:
-        d = row.get("date")
+        d = row["date"]
+        if d < history_start_iso:
+            has_expired_rows = True
+            continue
         code = row.get("region_code")
-        if not isinstance(d, str) or not isinstance(code, str):
+        if len(d) != 10 or not isinstance(code, str):
             continue
+        prev = latest_iso_by_region.get(code)
+        if prev is None or d > prev:
+            latest_iso_by_region[code] = d
+
+    latest_by_region: Dict[str, date] = {}
+    for code, d in latest_iso_by_region.items():
         try:
-            dt = date.fromisoformat(d)
+            latest_by_region[code] = date.fromisoformat(d)
         except ValueError:
             continue
-        if dt < history_start:
-            continue
-        prev = latest_by_region.get(code)
-        if prev is None or dt > prev:
-            latest_by_region[code] = dt
 
-    new_rows: List[Dict[str, Any]] = []
-    any_fetch = False
+    # Points that need the same date range can share one archive request.
+    points_by_range: Dict[tuple, List[Dict[str, Any]]] = {}
 
-    for pt in REGION_POINTS:
+    for pt in _region_points():
         region_code = pt.get("region_code")
         latest_for_region = latest_by_region.get(region_code) if isinstance(region_code, str) else None
 
@@ -358,24 +726,45 @@ def run_backfill_mode(out_path: Path) -> None:
         if start_fetch > end:
             continue
 
-        any_fetch = True
         start_iso = start_fetch.isoformat()
         end_iso = end.isoformat()
         print(f"[fetch_openmeteo] Fetching {start_iso} → {end_iso} for {region_code}")
-        new_rows.extend(fetch_daily_for_point(pt, start_iso, end_iso))
+        points_by_range.setdefault((start_iso, end_iso), []).append(pt)
+
+    batches = [
+        (points[i:i + ARCHIVE_BATCH_SIZE], start_iso, end_iso)
+        for (start_iso, end_iso), points in points_by_range.items()
+        for i in range(0, len(points), ARCHIVE_BATCH_SIZE)
+    ]
 
-    if not any_fetch:
+    new_rows: List[Dict[str, Any]] = []
+    if batches:
+        # map() yields results in submission order, so the output file keeps
+        # the same row order as a sequential run.
+        with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as executor:
+            for rows in executor.map(lambda batch: fetch_daily_for_points(*batch), batches):
+                new_rows.extend(rows)
+    elif not has_expired_rows and out_path.exists():
+        # Nothing fetched and nothing to trim: the file on disk is already
+        # the output, so skip re-encoding and rewriting it. (With no file
+        # yet, fall through so later stages still find one, even if empty.)
+        print(
+            "[fetch_openmeteo] No new dates to fetch and no rows older than "
+            f"{HISTORY_DAYS} days; leaving daily_region_raw.json untouched.",
+        )
+        return
+    else:
         print(
             "[fetch_openmeteo] No new dates to fetch for any region; "
             f"reusing existing daily_region_raw.json and trimming to the last {HISTORY_DAYS} days.",
         )
 
-    combined = existing_rows + new_rows
+    # Trim and merge in one pass instead of concatenating then filtering.
+    cutoff_iso = history_start_iso
+    trimmed = [row for row in existing_rows if row["date"] >= cutoff_iso]
+    trimmed.extend(row for row in new_rows if row["date"] >= cutoff_iso)
 
-    cutoff_iso = (end - timedelta(days=HISTORY_DAYS - 1)).isoformat()
-    trimmed = [row for row in combined if isinstance(row.get("date"), str) and row["date"] >= cutoff_iso]
-
-    out_path.write_text(json.dumps(trimmed, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(out_path, trimmed, compact=True)
     print(f"Wrote {len(trimmed)} rows to {out_path}")
 
 
@@ -388,44 +777,32 @@ def run_daily_mode(out_path: Path) -> None:
     - For each region point, fetch just today + tomorrow via the forecast API.
     - Append those rows and re‑trim to HISTORY_DAYS.
     """
-    existing_rows: List[Dict[str, Any]] = []
-    if out_path.exists():
-        try:
-            parsed = json.loads(out_path.read_text(encoding="utf-8"))
-            if isinstance(parsed, list):
-                existing_rows = parsed
-        except json.JSONDecodeError:
-            existing_rows = []
+    existing_rows = _load_existing_rows(out_path)
 
     today = date.today()
     tomorrow = today + timedelta(days=1)
     today_iso = today.isoformat()
     tomorrow_iso = tomorrow.isoformat()
+    history_start = today - timedelta(days=HISTORY_DAYS - 1)
+    cutoff_iso = history_start.isoformat()
 
-    # Keep only rows strictly before today; we'll overwrite today/tomorrow
-    # with fresh forecast data.
-    base_rows = [
-        row
-        for row in existing_rows
-        if not (isinstance(row.get("date"), str) and row["date"] >= today_iso)
-    ]
-
-    new_rows: List[Dict[str, Any]] = []
-    for pt in REGION_POINTS:
-        rows = fetch_forecast_for_point(pt)
-        # Safety: only keep the dates we care about.
-        for r in rows:
-            d = r.get("date")
-            if d == today_iso or d == tomorrow_iso:
-                new_rows.append(r)
+    # Keep only rows inside the history window and strictly before today;
+    # we'll overwrite today/tomorrow with fresh forecast data.
+    trimmed = [row for row in existing_rows if cutoff_iso <= row["date"] < today_iso]
 
-    combined = base_rows + new_rows
+    points = _region_points()
+    batch_size = 1 if OPENWEATHER_API_KEY else FORECAST_BATCH_SIZE
+    batches = [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
 
-    history_start = today - timedelta(days=HISTORY_DAYS - 1)
-    cutoff_iso = history_start.isoformat()
-    trimmed = [row for row in combined if isinstance(row.get("date"), str) and row["date"] >= cutoff_iso]
+    with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as executor:
+        for rows in executor.map(fetch_forecast_for_points, batches):
+            # Safety: only keep the dates we care about.
+            for r in rows:
+                d = r.get("date")
+                if d == today_iso or d == tomorrow_iso:
+                    trimmed.append(r)
 
-    out_path.write_text(json.dumps(trimmed, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(out_path, trimmed, compact=True)
     print(f"[fetch_openmeteo] Daily mode: wrote {len(trimmed)} rows (including today + tomorrow) to {out_path}")
 
 
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import json
+from json import JSONDecodeError  # orjson.JSONDecodeError subclasses this
+from pathlib import Path
+from typing import Any
+
+# orjson is much faster than the stdlib encoder/decoder on the large,
+# number-heavy row lists this pipeline shuffles around. Keep it optional so
+# the scripts still run in a bare environment.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def loads_json(payload: bytes) -> Any:
+    """Parse JSON from raw bytes (e.g. an HTTP response body)."""
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def read_json(path: Path) -> Any:
+    """Parse a JSON file, reading raw bytes so orjson can skip the decode."""
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _dumps_compact(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_json(path: Path, data: Any, compact: bool = False) -> None:
+    """
+    Write data as UTF-8 JSON, pretty-printed with indent=2 by default.
+
+    ``compact=True`` drops the indentation for the large row files: a list is
+    written one minified record per line, which is still a plain JSON array
+    but roughly half the size, much cheaper to encode, and keeps git diffs of
+    the committed data line-based.
+    """
+    if compact:
+        if isinstance(data, list) and data:
+            payload = b"[\n" + b",\n".join(_dumps_compact(item) for item in data) + b"\n]"
+        else:
+            payload = _dumps_compact(data)
+        path.write_bytes(payload)
+    elif orjson is not None:
+        path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -2,54 +2,83 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 from pathlib import Path
-import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from .build_region_points_auto import main as build_regions_main
 from .fetch_openmeteo import main as fetach_weather_main, HISTORY_DAYS
 from .compute_indices import main as compute_indices_main
 from .detect_alerts import main as detect_alerts_main
 from .export_for_web import main as export_for_web_main
+from .json_io import read_json, write_json
 
 
-def write_status(started_at: str, completed_at: str) -> None:
+def write_status(
+    started_at: str,
+    completed_at: str,
+    regions: Optional[List[Dict[str, Any]]] = None,
+    alerts: Optional[List[Dict[str, Any]]] = None,
+) -> None:
     """
     Write a small status JSON summarising the latest pipeline run so the
     website can show when data was last refreshed and how much is available.
+
+    ``regions`` and ``alerts`` are the rows the earlier stages just wrote;
+    when omitted they are read back from regions_daily.json / alerts.json.
     """
     base = Path(__file__).resolve().parents[1]
     regions_path = base / "data" / "regions_daily.json"
     alerts_path = base / "data" / "alerts.json"
     status_path = base / "data" / "pipeline_status.json"
 
-    try:
-        regions: List[Dict[str, Any]] = json.loads(regions_path.read_text(encoding="utf-8"))
-    except FileNotFoundError:
-        regions = []
-
-    try:
-        alerts: List[Dict[str, Any]] = json.loads(alerts_path.read_text(encoding="utf-8"))
-    except FileNotFoundError:
-        alerts = []
-
-    countries = sorted({row.get("country") for row in regions if row.get("country")})
-    region_codes = sorted({row.get("region_code") for row in regions if row.get("region_code")})
-    dates = sorted({row.get("date") for row in regions if row.get("date")})
+    if regions is None:
+        try:
+            regions = read_json(regions_path)
+        except FileNotFoundError:
+            regions = []
+
+    if alerts is None:
+        try:
+            alerts = read_json(alerts_path)
+        except FileNotFoundError:
+            alerts = []
+
+    # Collect everything in one pass over the (large) regions list. Only the
+    # first and last dates are reported, and ISO dates compare correctly as
+    # strings, so track those two instead of collecting every date.
+    country_set = set()
+    region_code_set = set()
+    start_date = None
+    end_date = None
+    for row in regions:
+        country = row.get("country")
+        if country:
+            country_set.add(country)
+        region_code = row.get("region_code")
+        if region_code:
+            region_code_set.add(region_code)
+        d = row.get("date")
+        if d:
+            if start_date is None or d < start_date:
+                start_date = d
+            if end_date is None or d > end_date:
+                end_date = d
+
+    countries = sorted(country_set)
 
     status = {
         "started_at_utc": started_at,
         "completed_at_utc": completed_at,
         "history_days": HISTORY_DAYS,
         "countries": countries,
-        "regions_count": len(region_codes),
+        "regions_count": len(region_code_set),
         "rows_count": len(regions),
         "alerts_count": len(alerts),
-        "data_start_date": dates[0] if dates else None,
-        "data_end_date": dates[-1] if dates else None,
+        "data_start_date": start_date,
+        "data_end_date": end_date,
     }
 
     status_path.parent.mkdir(parents=True, exist_ok=True)
-    status_path.write_text(json.dumps(status, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(status_path, status)
     print(f"Wrote pipeline_status.json to {status_path}")
 
 def run_pipeline() -> None:
@@ -64,13 +93,13 @@ def run_pipeline() -> None:
     fetach_weather_main()
 
     print("3) Computing hazard levels per region/day...")
-    compute_indices_main() 
+    regions = compute_indices_main()
 
     print("4) Detecting multi-day alerts per region...")
-    detect_alerts_main() 
+    alerts = detect_alerts_main()
 
     done = datetime.now(timezone.utc).isoformat(timespec="seconds")
-    write_status(started_at=started, completed_at=done)
+    write_status(started_at=started, completed_at=done, regions=regions, alerts=alerts)
 
     print("5) Exporting JSON for website...")
     export_for_web_main()